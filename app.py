@@ -1,9 +1,27 @@
-from flask import Flask, render_template, jsonify, request
-from counselor import MyCounselor
+import math
+import os
+import re
+import uuid
+from startup import report
+
+with report.phase('import'):
+    from flask import Flask, render_template, jsonify, request
+    from counselor import MyCounselor
+    from model_scheduler import SchedulerOverloaded
+    from session_store import SessionConflict
 
 app = Flask(__name__)
 
-chatbot = MyCounselor()
+with report.phase('counselor'):
+    chatbot = MyCounselor()
+
+if os.getenv('WARMUP_ON_START', '1') == '1':
+    with report.phase('warmup'):
+        chatbot.warmup()
+
+# hex ids like the ones we hand out (uuid4, with or without dashes) - anything
+# else is ignored so clients can't pick arbitrary or oversized keys
+SESSION_ID_PATTERN = re.compile(r"[0-9a-fA-F-]{8,64}")
 
 @app.route("/")
 def home():
@@ -14,12 +32,34 @@ def chat():
     data = request.get_json()
     message = data['message']
     degree = data.get('degree_type', '4year')
+    # the session id travels with the client, so any worker can pick the conversation up
+    session_id = data.get('session_id')
+    if not isinstance(session_id, str) or not SESSION_ID_PATTERN.fullmatch(session_id):
+        session_id = uuid.uuid4().hex
+
+    try:
+        response = chatbot.counselor_chat(session_id, message, degree)
+    except SchedulerOverloaded as e:
+        overloaded = jsonify({"error": str(e)})
+        # round up - "0" would tell clients to retry straight away
+        overloaded.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after or 1)))
+        return overloaded, 503
+    except SessionConflict:
+        # the other request's turn was kept; this one was built on stale history
+        return jsonify({"error": "This conversation changed while you were waiting, please send that again"}), 409
 
-    chatbot.set_degree_preference(degree)
+    return jsonify({"reply": response, "session_id": session_id})
 
-    response = chatbot.counselor_chat(message)
 
-    return jsonify({"reply": response})
+@app.route('/api/metrics')
+def metrics():
+    return jsonify({
+        "response_cache": chatbot.response_cache.stats(),
+        "model_scheduler": chatbot.scheduler.stats(),
+        "model_routes": chatbot.router.metrics.stats(),
+        "sessions": chatbot.sessions.stats(),
+        "startup": report.as_dict(),
+    })
 
 
 @app.route("/faq")
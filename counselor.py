@@ -1,8 +1,18 @@
 from dotenv import load_dotenv
 from anthropic import Anthropic
+import os
 import sqlite3
+import threading
+from model_router import ModelRouter, is_trivial_turn, search_likely
+from model_scheduler import ModelCallScheduler
+from response_cache import ResponseCache, prompt_version
+from session_store import create_session_store
 load_dotenv()
 
+MODEL = "claude-sonnet-4-5-20250929"
+# Small, fast model for tool selection and trivial replies - set empty to use MODEL for everything
+ROUTER_MODEL = os.getenv('ROUTER_MODEL', 'claude-haiku-4-5-20251001')
+
 tools = [    {
         "name": "query_equity_outcomes",
         "description": "Search colleges specifically for equity metrics: serves underserved populations, Pell grant recipients, debt-to-income ratios, social impact scores, champion/hidden gem status.",
@@ -182,18 +192,84 @@ Remember: Your role is to be a knowledgeable, supportive guide who helps student
 
 """
 
+# Opening-turn replies only depend on these, so they make up the cache version
+PROMPT_VERSION = prompt_version(MODEL, ROUTER_MODEL, SYSTEM_PROMPT, tools)
+
 class MyCounselor: 
 
     def __init__(self, db_path='new_college.db'):
-        self.client = Anthropic()
-        self.conversation_history = []
+        # the API client holds a connection pool, so it's built on first use -
+        # after gunicorn forks - rather than shared from the master
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.scheduler = ModelCallScheduler(
+            max_concurrent=int(os.getenv('MODEL_MAX_CONCURRENT', '8')),
+            max_queue=int(os.getenv('MODEL_MAX_QUEUE', '32')),
+            queue_timeout=float(os.getenv('MODEL_QUEUE_TIMEOUT', '10')),
+            max_retries=int(os.getenv('MODEL_MAX_RETRIES', '3')),
+            # set by gunicorn.conf.py so the limits cover every worker, not just this one
+            slot_dir=os.getenv('MODEL_SLOT_DIR') or None,
+        )
+        self.router = ModelRouter(
+            self.scheduler,
+            lambda: self.client,
+            small_model=ROUTER_MODEL or None,
+        )
+        self.sessions = create_session_store(
+            os.getenv('SESSION_STORE', 'sqlite:///sessions.db'),
+            ttl=int(os.getenv('SESSION_TTL', '86400')),
+            compress=os.getenv('SESSION_COMPRESS', '1') == '1',
+            expire_interval=float(os.getenv('SESSION_EXPIRE_INTERVAL', '300')),
+        )
         self.db_path = db_path
         self.degree_preference = '4year'
+        self.response_cache = ResponseCache(
+            max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '256')),
+            path=os.getenv('RESPONSE_CACHE_PATH') or None,
+            version=PROMPT_VERSION,
+        )
     
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    # retries are handled by the scheduler, which backs off without holding a slot
+                    self._client = Anthropic(max_retries=0)
+        return self._client
+
+    def warmup(self):
+        """Make sure the search index exists and read the common searches once.
+
+        Each search opens its own connection, so SQLite's page cache doesn't
+        carry over - this warms the OS file cache under it.
+        """
+        if not os.path.exists(self.db_path):
+            print(f"Warmup skipped: {self.db_path} not found")
+            return
+        conn = sqlite3.connect(self.db_path)
+        try:
+            # also created by import_csv.py, but older databases predate it
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_social_state ON social (`State Abbreviation`)")
+            conn.commit()
+        except sqlite3.Error as e:
+            # e.g. a read-only database - the read warmup below still helps
+            print(f"Index creation skipped: {e}")
+        finally:
+            conn.close()
+        try:
+            for degree_type in ('4year', 'community'):
+                self.query_equity_outcomes(degree_type)
+                self.query_equity_outcomes(degree_type, serves_underserved=True)
+        except sqlite3.Error as e:
+            print(f"Warmup skipped: {e}")
+
     def set_degree_preference(self, degree_type):
         self.degree_preference = degree_type
     
-    def query_equity_outcomes(self, **filters):
+    def query_equity_outcomes(self, degree_preference=None, **filters):
+        # passed in per request - the instance default is shared by every thread
+        degree_preference = degree_preference or self.degree_preference
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
@@ -201,10 +277,10 @@ class MyCounselor:
         params = []
         
         # Degree preference filter
-        if self.degree_preference == 'community':
+        if degree_preference == 'community':
             query += " AND `Institution Name` LIKE ?"
             params.append('%Community%')
-        elif self.degree_preference == '4year':
+        elif degree_preference == '4year':
             query += " AND `Institution Name` NOT LIKE ?"
             params.append('%Community%')
         
@@ -236,25 +312,70 @@ class MyCounselor:
         
         return results
 
-    def counselor_chat(self, user_message):
-        self.conversation_history.append({
+    def counselor_chat(self, session_id, user_message, degree_preference=None):
+        # read once, so the cache key and the search can't pick up another
+        # request's preference partway through the turn
+        degree_preference = degree_preference or self.degree_preference
+        history = self.sessions.load(session_id)
+
+        # Only first turns are cacheable - later replies depend on the history
+        first_turn = not history
+        if first_turn:
+            cached = self.response_cache.get(user_message, degree_preference)
+            if cached is not None:
+                self.sessions.append(session_id, [
+                    {"role": "user", "content": user_message},
+                    {"role": "assistant", "content": cached},
+                ], expected_length=0)
+                return cached
+
+        # Only the messages from this turn get written back, and only once the
+        # turn succeeds, so a failed call never leaves a dangling user message
+        messages = history
+        new_from = len(history)
+
+        messages.append({
             "role" : "user",
             "content" : user_message,
 
         })
 
-        response = self.client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=1024,
-            system=SYSTEM_PROMPT,
-            messages=self.conversation_history,
-            tools=tools,
-        )
+        # routing is decided up front so turns that won't search make one call, as before
+        response = None
+        if ROUTER_MODEL and is_trivial_turn(user_message, history[:new_from]):
+            # "hi" / "thanks" - no search and no counselling, the small model can reply
+            response = self.router.reply_trivial(
+                max_tokens=1024,
+                system=SYSTEM_PROMPT,
+                messages=messages,
+                # earlier turns may hold tool blocks, which need tools defined
+                tools=tools,
+                tool_choice={"type": "none"},
+            )
+        elif search_likely(user_message, history[:new_from]):
+            # let the small model pick search filters; None means the large model decides
+            response = self.router.select_tools(
+                tools,
+                # enough for a tool call, and caps the cost when it answers in prose instead
+                max_tokens=512,
+                system=SYSTEM_PROMPT,
+                messages=messages,
+            )
+
+        if response is None:
+            response = self.router.create(
+                "answer",
+                MODEL,
+                max_tokens=1024,
+                system=SYSTEM_PROMPT,
+                messages=messages,
+                tools=tools,
+            )
 
         #need to check if claude wants to use a tool
         if response.stop_reason == "tool_use":
             # Don't extract text yet - Claude is still thinking!
-            self.conversation_history.append({
+            messages.append({
                 "role": "assistant",
                 "content": response.content
             })
@@ -263,7 +384,7 @@ class MyCounselor:
             for block in response.content:
                 if block.type == "tool_use":
 
-                    results = self.query_equity_outcomes(**block.input)
+                    results = self.query_equity_outcomes(degree_preference, **block.input)
                     
                     tool_results.append({
                         "type": "tool_result",
@@ -271,17 +392,18 @@ class MyCounselor:
                         "content": str(results)
                     })
             
-            self.conversation_history.append({
+            messages.append({
                 "role": "user",
                 "content": tool_results
             })
             
             # NOW get the real response after tools
-            final_response = self.client.messages.create(
-                model="claude-sonnet-4-5-20250929",
+            final_response = self.router.create(
+                "answer",
+                MODEL,
                 max_tokens=1024,
                 system=SYSTEM_PROMPT,
-                messages=self.conversation_history,
+                messages=messages,
                 tools=tools
             )
             
@@ -290,16 +412,22 @@ class MyCounselor:
                 if hasattr(block, 'text'):
                     assistant_message += block.text
             
-            self.conversation_history.append({
+            messages.append({
                 "role": "assistant",
                 "content": assistant_message
             })
 
         else:
             assistant_message = response.content[0].text
-            self.conversation_history.append({
+            messages.append({
                 "role" : "assistant",
                 "content" : assistant_message,
             })
 
-        return assistant_message
\ No newline at end of file
+        # raises SessionConflict if an overlapping request for this session finished first
+        self.sessions.append(session_id, messages[new_from:], expected_length=new_from)
+
+        if first_turn:
+            self.response_cache.put(user_message, degree_preference, assistant_message)
+
+        return assistant_message
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the equity metrics pipeline
+Times each stage and records its peak memory on the bundled data and on
+synthetic copies scaled up, then compares the report against a baseline
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from calculate_equity_metrics import (
+    calculate_basic_metrics,
+    calculate_graduation_equity_metrics,
+    calculate_economic_mobility_metrics,
+    calculate_affordability_metrics,
+    calculate_msi_metrics,
+    calculate_composite_scores,
+    identify_special_categories,
+    create_tableau_export,
+)
+
+BUNDLED_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'CollegeResultsData.csv')
+
+# Same order as main() in calculate_equity_metrics.py
+STAGES = [
+    ('calculate_basic_metrics', calculate_basic_metrics),
+    ('calculate_graduation_equity_metrics', calculate_graduation_equity_metrics),
+    ('calculate_economic_mobility_metrics', calculate_economic_mobility_metrics),
+    ('calculate_affordability_metrics', calculate_affordability_metrics),
+    ('calculate_msi_metrics', calculate_msi_metrics),
+    ('calculate_composite_scores', calculate_composite_scores),
+    ('identify_special_categories', identify_special_categories),
+    ('create_tableau_export', create_tableau_export),
+]
+
+# The bundled file is the College Results export only; these normally come
+# from the affordability merge, so fill them with plausible values
+AFFORDABILITY_COLUMNS = {
+    'Net Price': (5000, 35000),
+    'Weekly Hours to Close Gap': (0, 50),
+    'Affordability Gap (net price minus income earned working 10 hrs at min wage)': (-5000, 30000),
+    'Student Parent Affordability Gap: Center-Based Care': (0, 45000),
+}
+MSI_COLUMNS = {'HBCU': 0.03, 'HSI': 0.15, 'TRIBAL': 0.01, 'PBI': 0.03}
+
+# Columns the stages read that get jittered in scaled copies so rows aren't identical
+JITTER_COLUMNS = [
+    'Median Earnings of Students Working and Not Enrolled 10 Years After Entry',
+    'Median Debt of Completers',
+    'Net Price',
+    'Weekly Hours to Close Gap',
+    'Percent of First-Time, Full-Time Undergraduates Awarded Pell Grants',
+]
+
+
+def load_bundled_data(path=BUNDLED_CSV, seed=0):
+    """Load the bundled CSV and add the columns the merge would have provided"""
+    df = pd.read_csv(path, low_memory=False)
+    rng = np.random.default_rng(seed)
+
+    for col, (low, high) in AFFORDABILITY_COLUMNS.items():
+        if col not in df.columns:
+            df[col] = rng.uniform(low, high, len(df)).round(2)
+
+    for col, share in MSI_COLUMNS.items():
+        if col not in df.columns:
+            df[col] = np.where(rng.random(len(df)) < share, 'X', '')
+
+    return df
+
+
+def scale_data(df, factor, seed=0):
+    """Stack factor copies of df, jittering key numeric inputs by up to +/-10%"""
+    if factor == 1:
+        return df.copy()
+
+    rng = np.random.default_rng(seed)
+    scaled = pd.concat([df] * factor, ignore_index=True)
+    copy_number = np.repeat(np.arange(factor), len(df))
+    scaled['Institution Name'] = scaled['Institution Name'].astype(str) + ' #' + copy_number.astype(str)
+
+    for col in JITTER_COLUMNS:
+        if col in scaled.columns:
+            values = pd.to_numeric(scaled[col], errors='coerce')
+            scaled[col] = values * rng.uniform(0.9, 1.1, len(scaled))
+
+    return scaled
+
+
+def run_stages(df, trace_memory=False):
+    """Run every stage once, returning its wall time or, when tracing, its peak memory.
+
+    tracemalloc slows stages down by uneven amounts, so timings and memory
+    come from separate runs.
+    """
+    results = {}
+    # the pipeline prints progress from every stage; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, stage in STAGES:
+            if trace_memory:
+                tracemalloc.start()
+                out = stage(df)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                results[name] = round(peak / (1024 * 1024), 3)
+            else:
+                start = time.perf_counter()
+                out = stage(df)
+                results[name] = round(time.perf_counter() - start, 5)
+
+            # the export stage returns a new frame; every other stage returns df
+            if name != 'create_tableau_export':
+                df = out
+    return results
+
+
+def benchmark(scales, repeat=3):
+    """Benchmark the pipeline at each scale: best untraced time plus one traced run for memory"""
+    base = load_bundled_data()
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'repeat': repeat,
+        },
+        'runs': {},
+    }
+
+    for factor in scales:
+        label = 'bundled' if factor == 1 else f'synthetic_x{factor}'
+        data = scale_data(base, factor)
+        print(f"Benchmarking {label} ({len(data):,} rows)...")
+
+        # stages add columns in place, so each run starts from a fresh copy
+        timings = [run_stages(data.copy()) for _ in range(repeat)]
+        memory = run_stages(data.copy(), trace_memory=True)
+        stages = {
+            name: {
+                'seconds': min(run[name] for run in timings),
+                'peak_mb': memory[name],
+            }
+            for name, _ in STAGES
+        }
+
+        report['runs'][label] = {
+            'rows': len(data),
+            'scale': factor,
+            'total_seconds': round(sum(s['seconds'] for s in stages.values()), 5),
+            'stages': stages,
+        }
+    return report
+
+
+def compare_reports(current, baseline, tolerance=0.25, min_seconds=0.02, min_mb=1.0):
+    """List stages that got slower or hungrier than the baseline by more than tolerance.
+
+    Differences under min_seconds / min_mb are treated as noise.
+    """
+    regressions = []
+    for label, run in current['runs'].items():
+        base_run = baseline.get('runs', {}).get(label)
+        if base_run is None:
+            continue
+        for name, stage in run['stages'].items():
+            base_stage = base_run['stages'].get(name)
+            if base_stage is None:
+                continue
+            for metric, floor in (('seconds', min_seconds), ('peak_mb', min_mb)):
+                now, before = stage[metric], base_stage[metric]
+                if now - before > floor and now > before * (1 + tolerance):
+                    regressions.append({
+                        'run': label,
+                        'stage': name,
+                        'metric': metric,
+                        'baseline': before,
+                        'current': now,
+                        'ratio': round(now / before, 3) if before else None,
+                    })
+    return regressions
+
+
+def print_report(report):
+    for label, run in report['runs'].items():
+        print(f"\n{label} - {run['rows']:,} rows, {run['total_seconds']:.3f}s total")
+        slowest = max(run['stages'].items(), key=lambda item: item[1]['seconds'])[0]
+        for name, stage in run['stages'].items():
+            marker = '  <- slowest' if name == slowest else ''
+            print(f"  {name:<38} {stage['seconds']:>9.4f}s {stage['peak_mb']:>9.1f} MB{marker}")
+
+
+def main(argv=None):
+    """Run the benchmark from the command line; returns 1 if regressions were found"""
+    parser = argparse.ArgumentParser(description='Benchmark the equity metrics pipeline')
+    parser.add_argument('--scales', default='1,10,100',
+                        help='comma separated scale factors over the bundled data (default 1,10,100)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per scale, best time is kept')
+    parser.add_argument('--output', default='benchmark_report.json', help='where to write the JSON report')
+    parser.add_argument('--baseline', help='report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown/memory growth before flagging (default 0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    report = benchmark(scales, repeat=args.repeat)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report['regressions'] = compare_reports(report, baseline, tolerance=args.tolerance)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_report(report)
+    print(f"\nReport written to {args.output}")
+
+    if args.baseline:
+        regressions = report['regressions']
+        if not regressions:
+            print(f"No regressions against {args.baseline}")
+            return 0
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+        for r in regressions:
+            print(f"  - {r['run']} / {r['stage']}: {r['metric']} {r['baseline']} -> {r['current']}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,7 @@ Equity Metrics Calculator for College ROI Datathon
 Calculates all social good metrics and exports for Tableau
 """
 
+import sys
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler
@@ -445,4 +446,8 @@ def main():
     print("4. Add calculated fields from the guide")
 
 if __name__ == "__main__":
+    # --benchmark [options] times each stage instead, see benchmark_equity_metrics.py
+    if len(sys.argv) > 1 and sys.argv[1] == '--benchmark':
+        from benchmark_equity_metrics import main as benchmark_main
+        sys.exit(benchmark_main(sys.argv[2:]))
     main()
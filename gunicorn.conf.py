@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+import tempfile
+
+from startup import report
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# More than one thread switches gunicorn to gthread workers. That is safe
+# because per-request state (session id, degree preference) is passed into
+# counselor_chat rather than stored on the shared chatbot
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = 120
+
+# Workers share the model call limits through lock files in this directory,
+# so MODEL_MAX_CONCURRENT caps the whole server rather than each worker
+os.environ.setdefault("MODEL_SLOT_DIR", os.path.join(tempfile.gettempdir(), "affordable4u-model-slots"))
+
+# Import app.py (counselor, response cache, DB warmup) once in the master so
+# workers share those pages copy-on-write instead of each loading their own.
+# The Anthropic client is created lazily, so nothing with sockets is inherited.
+preload_app = os.getenv("PRELOAD_APP", "1") == "1"
+
+
+def when_ready(server):
+    if preload_app:
+        report.freeze()
+    report.log(server.log)
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s forked from master %s", worker.pid, report.pid)
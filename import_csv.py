@@ -6,6 +6,8 @@ def import_to_csvs():
 
     df1 = pd.read_csv('data/social_impact_final.csv')
     df1.to_sql('social', conn, if_exists='replace', index=False)
+    # state is the most common search filter
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_social_state ON social (`State Abbreviation`)")
     
     conn.close()
     print('To db is done')
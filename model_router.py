@@ -0,0 +1,199 @@
+import re
+import threading
+import time
+
+import anthropic
+
+from model_scheduler import SchedulerOverloaded
+
+# Greetings and thanks - safe for the small model. Acknowledgements like "ok"
+# or "sounds good" are left out: mid-conversation they usually accept an offer
+# to search, which needs tools and the large model
+TRIVIAL_MESSAGES = {
+    "hi", "hello", "hey", "hi there", "hello there", "hey there",
+    "thanks", "thank you", "thanks so much", "thank you so much", "thx", "ty",
+    "bye", "goodbye",
+}
+
+STATE_NAMES = (
+    "alabama|alaska|arizona|arkansas|california|colorado|connecticut|delaware|florida|"
+    "georgia|hawaii|idaho|illinois|indiana|iowa|kansas|kentucky|louisiana|maine|maryland|"
+    "massachusetts|michigan|minnesota|mississippi|missouri|montana|nebraska|nevada|"
+    "new hampshire|new jersey|new mexico|new york|north carolina|north dakota|ohio|"
+    "oklahoma|oregon|pennsylvania|rhode island|south carolina|south dakota|tennessee|"
+    "texas|utah|vermont|virginia|washington|west virginia|wisconsin|wyoming"
+)
+
+# Words that suggest query_equity_outcomes is about to be called
+SEARCH_HINTS = re.compile(
+    r"\b(colleges?|schools?|universit(y|ies)|campus(es)?|hbcus?|hsis?|msis?|pell|debt|"
+    r"afford\w*|cheap\w*|tuition|net price|earnings|underserved|champions?|hidden gems?|"
+    r"find|search|look up|show me|list|recommend\w*|options|" + STATE_NAMES + r")\b",
+    re.IGNORECASE,
+)
+
+JSON_TYPES = {
+    "string": str,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+STATE_PATTERN = re.compile(r"^[A-Z]{2}$")
+# "AZ" typed on its own; case sensitive so "in" / "me" / "ok" don't count
+STATE_CODE = re.compile(
+    r"\b(A[KLRZ]|C[AOT]|D[CE]|FL|GA|HI|I[ADLN]|K[SY]|LA|M[ADEINOST]|N[CDEHJMVY]|"
+    r"O[HKR]|PA|RI|S[CD]|T[NX]|UT|V[AT]|W[AIVY])\b"
+)
+
+
+def last_assistant_text(history):
+    for message in reversed(history):
+        if message["role"] != "assistant":
+            continue
+        content = message["content"]
+        if isinstance(content, str):
+            return content
+        return " ".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return ""
+
+
+def is_trivial_turn(message, history):
+    """A greeting or thanks that isn't answering a question the assistant just asked"""
+    if " ".join(message.lower().split()).strip("!.?, ") not in TRIVIAL_MESSAGES:
+        return False
+    return "?" not in last_assistant_text(history)
+
+
+def search_likely(message, history):
+    """Guess, before any call, whether this turn will search.
+
+    Only then is tool selection worth a small-model call; other turns go
+    straight to the large model, which can still search on its own.
+    """
+    if SEARCH_HINTS.search(message) or STATE_CODE.search(message):
+        return True
+    # a short "yes please" to an offer like "Want me to look up HBCUs in Georgia?"
+    previous = last_assistant_text(history)
+    return len(message.split()) <= 4 and "?" in previous and bool(SEARCH_HINTS.search(previous))
+
+
+def validate_tool_call(block, tools):
+    """Return why a tool_use block doesn't fit its tool's input_schema, or None if it does"""
+    tool = next((t for t in tools if t["name"] == block.name), None)
+    if tool is None:
+        return f"unknown tool {block.name}"
+    if not isinstance(block.input, dict):
+        return "input is not an object"
+
+    properties = tool["input_schema"].get("properties", {})
+    for key, value in block.input.items():
+        if key not in properties:
+            return f"unknown argument {key}"
+        expected = JSON_TYPES.get(properties[key].get("type"))
+        # bool is an int subclass, so a boolean must not pass as a number
+        if expected is not None and (not isinstance(value, expected)
+                                     or (expected is not bool and isinstance(value, bool))):
+            return f"{key} should be {properties[key]['type']}"
+        if expected == (int, float) and value < 0:
+            return f"{key} is negative"
+    if "state" in block.input and not STATE_PATTERN.match(block.input["state"]):
+        return "state is not a two-letter abbreviation"
+    return None
+
+
+class RouteMetrics:
+    """Call count, latency and token usage for each route"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._fallbacks = {}
+
+    def record(self, route, model, seconds, usage=None, error=False):
+        with self._lock:
+            stats = self._routes.setdefault(route, {
+                "model": model,
+                "calls": 0,
+                "errors": 0,
+                "total_seconds": 0.0,
+                "max_seconds": 0.0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+            })
+            stats["model"] = model
+            stats["calls"] += 1
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            if error:
+                stats["errors"] += 1
+            if usage is not None:
+                stats["input_tokens"] += usage.input_tokens
+                stats["output_tokens"] += usage.output_tokens
+
+    def record_fallback(self, reason):
+        with self._lock:
+            self._fallbacks[reason] = self._fallbacks.get(reason, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            routes = {}
+            for route, stats in self._routes.items():
+                routes[route] = dict(stats, avg_seconds=stats["total_seconds"] / stats["calls"])
+            return {"routes": routes, "fallbacks": dict(self._fallbacks)}
+
+
+class ModelRouter:
+    """Sends cheap steps (tool selection, trivial replies) to a small model.
+
+    The large model still writes every answer that needs counselling, and
+    takes over tool selection whenever the small model's call doesn't validate.
+    """
+
+    def __init__(self, scheduler, get_client, small_model=None):
+        self.scheduler = scheduler
+        self.get_client = get_client
+        self.small_model = small_model
+        self.metrics = RouteMetrics()
+
+    def create(self, route, model, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.scheduler.call(self.get_client().messages.create, model=model, **kwargs)
+        except Exception:
+            self.metrics.record(route, model, time.perf_counter() - start, error=True)
+            raise
+        self.metrics.record(route, model, time.perf_counter() - start, getattr(response, "usage", None))
+        return response
+
+    def select_tools(self, tools, **kwargs):
+        """Ask the small model which tools to call.
+
+        Returns its response if it made valid tool calls, otherwise None so the
+        caller falls back to the large model for this step.
+        """
+        response = self._create_small("tool_selection", tools=tools, **kwargs)
+        if response is None:
+            return None
+        if response.stop_reason != "tool_use":
+            # the search guess was wrong - the answer itself belongs to the large model
+            self.metrics.record_fallback("no_tool_call")
+            return None
+        for block in response.content:
+            if block.type == "tool_use" and validate_tool_call(block, tools) is not None:
+                self.metrics.record_fallback("invalid_tool_call")
+                return None
+        return response
+
+    def reply_trivial(self, **kwargs):
+        """Let the small model answer a greeting or thanks - None means the large model should"""
+        return self._create_small("trivial", **kwargs)
+
+    def _create_small(self, route, **kwargs):
+        if not self.small_model:
+            return None
+        try:
+            return self.create(route, self.small_model, **kwargs)
+        except (anthropic.APIStatusError, SchedulerOverloaded):
+            # already retried by the scheduler - a failed shortcut shouldn't fail the turn
+            self.metrics.record_fallback("error")
+            return None
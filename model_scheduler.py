@@ -0,0 +1,227 @@
+import os
+import random
+import threading
+import time
+
+import anthropic
+
+try:
+    import fcntl
+except ImportError:  # Windows - only the in-process limit is available
+    fcntl = None
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when a model call can't get a slot - the route turns this into a 503"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# 429 rate limits, 5xx errors and 529 overloads are worth another try. Matching
+# on the status code covers SDK versions where 529 is OverloadedError, which is
+# a sibling of InternalServerError rather than a subclass
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+
+
+def is_retryable(error):
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+
+def retry_after_seconds(error):
+    """Read the server's retry-after hint off an API error, if it sent one"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class ThreadSlots:
+    """Counting semaphore for the threads of one process"""
+
+    def __init__(self, count):
+        self._semaphore = threading.BoundedSemaphore(count)
+
+    def acquire(self, timeout=None):
+        if timeout == 0:
+            return True if self._semaphore.acquire(blocking=False) else None
+        return True if self._semaphore.acquire(timeout=timeout) else None
+
+    def release(self, token):
+        self._semaphore.release()
+
+
+class FileSlots:
+    """Counting semaphore shared by every process on the host.
+
+    Each slot is a lock file held with flock, so a slot frees itself when
+    the worker holding it exits or crashes - nothing can leak.
+    """
+
+    def __init__(self, directory, name, count, poll_interval=0.02):
+        self.paths = [os.path.join(directory, f"{name}-{i}.lock") for i in range(count)]
+        self.poll_interval = poll_interval
+        os.makedirs(directory, exist_ok=True)
+
+    def _try_lock(self, path):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            # start at a random slot so waiters don't all fight over slot 0
+            offset = random.randrange(len(self.paths))
+            for i in range(len(self.paths)):
+                fd = self._try_lock(self.paths[(offset + i) % len(self.paths)])
+                if fd is not None:
+                    return fd
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(random.uniform(0.5, 1.5) * self.poll_interval)
+
+    def release(self, token):
+        fcntl.flock(token, fcntl.LOCK_UN)
+        os.close(token)
+
+
+class ModelCallScheduler:
+    """Caps concurrent model calls, queues a bounded number of waiters and retries overloads.
+
+    With slot_dir set (and fcntl available) the limits hold across every
+    gunicorn worker on the host; otherwise they apply to this process only.
+    """
+
+    def __init__(self, max_concurrent=8, max_queue=32, queue_timeout=10.0,
+                 max_retries=3, base_delay=0.5, max_delay=20.0, slot_dir=None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.shared = bool(slot_dir) and fcntl is not None
+        if self.shared:
+            self._slots = FileSlots(slot_dir, "slot", max_concurrent)
+            self._waiting = FileSlots(slot_dir, "queue", max_queue)
+        else:
+            self._slots = ThreadSlots(max_concurrent)
+            self._waiting = ThreadSlots(max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.retries = 0
+        self.failures = 0
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn under a slot, backing off and retrying on retryable API errors"""
+        attempt = 0
+        while True:
+            token = self._acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except (anthropic.APIStatusError, anthropic.APIConnectionError) as error:
+                if not is_retryable(error):
+                    raise
+                if attempt >= self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise SchedulerOverloaded(
+                        "The model is overloaded, try again shortly", retry_after_seconds(error)
+                    ) from error
+                delay = self._backoff(attempt, retry_after_seconds(error))
+            else:
+                with self._lock:
+                    self.completed += 1
+                return result
+            finally:
+                self._release(token)
+
+            # sleep without holding a slot so other requests can use it
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            time.sleep(delay)
+
+    def _backoff(self, attempt, retry_after):
+        # full jitter keeps a burst of failed calls from retrying in lockstep
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def _acquire(self):
+        token = self._slots.acquire(timeout=0)
+        if token is not None:
+            with self._lock:
+                self.in_flight += 1
+            return token
+
+        # holding a queue slot is what makes the wait queue bounded
+        waiting = self._waiting.acquire(timeout=0)
+        if waiting is None:
+            with self._lock:
+                self.rejected += 1
+            raise SchedulerOverloaded("Too many requests waiting for the model", self.queue_timeout)
+        with self._lock:
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        try:
+            token = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            self._waiting.release(waiting)
+            with self._lock:
+                self.queued -= 1
+        if token is None:
+            with self._lock:
+                self.timed_out += 1
+            raise SchedulerOverloaded("Timed out waiting for the model", self.queue_timeout)
+        with self._lock:
+            self.in_flight += 1
+        return token
+
+    def _release(self, token):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release(token)
+
+    def stats(self):
+        # counters are for this worker; probing the shared lock files would
+        # mean briefly taking real slots away from requests
+        with self._lock:
+            return {
+                "shared": self.shared,
+                "pid": os.getpid(),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "peak_queued": self.peak_queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "retries": self.retries,
+                "failures": self.failures,
+            }
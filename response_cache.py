@@ -0,0 +1,152 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows - saves from several processes may race
+    fcntl = None
+
+
+def normalize_message(message):
+    # "Hi!", "hi" and "  HI  " should all land on the same entry
+    return " ".join(message.lower().split()).rstrip("!.?")
+
+
+def prompt_version(*parts):
+    """Hash everything that shapes a reply so a prompt edit invalidates the cache"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class ResponseCache:
+    """Bounded LRU cache of replies to opening turns (no prior history)"""
+
+    def __init__(self, max_entries=256, path=None, version="", save_interval=30.0):
+        self.max_entries = max_entries
+        self.path = path
+        self.version = version
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+        if self.path:
+            self._load()
+            # entries added since the last periodic save
+            atexit.register(self.flush)
+
+    def make_key(self, message, degree_preference):
+        raw = "\x1f".join([self.version, degree_preference, normalize_message(message)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, message, degree_preference):
+        key = self.make_key(message, degree_preference)
+        with self._lock:
+            reply = self._entries.get(key)
+            if reply is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return reply
+
+    def put(self, message, degree_preference, reply):
+        key = self.make_key(message, degree_preference)
+        with self._lock:
+            self._entries[key] = reply
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+        # saving happens outside _lock and at most every save_interval, so gets never wait on disk
+        if self.path and time.monotonic() - self._last_save >= self.save_interval:
+            self.flush()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self._dirty = False
+        if self.path:
+            with self._save_lock:
+                self._write([], merge=False)
+
+    def flush(self):
+        """Write pending entries to disk, unless another thread is already saving"""
+        if not self.path or not self._save_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                if not self._dirty:
+                    return
+                entries = list(self._entries.items())
+                self._dirty = False
+            self._last_save = time.monotonic()
+            self._write(entries)
+        finally:
+            self._save_lock.release()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "version": self.version,
+            }
+
+    def _load(self):
+        for key, reply in self._read_file()[-self.max_entries:]:
+            self._entries[key] = reply
+
+    def _read_file(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return []
+        # entries written under an older prompt are stale, drop them
+        if data.get("version") != self.version:
+            return []
+        return data.get("entries", [])
+
+    def _write(self, entries, merge=True):
+        # other workers save to the same file: hold a lock file while merging
+        # their entries with ours, so neither side's additions get dropped
+        lock_fd = None
+        try:
+            if fcntl is not None:
+                lock_fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+
+            merged = OrderedDict(self._read_file() if merge else [])
+            for key, reply in entries:
+                merged[key] = reply
+                merged.move_to_end(key)
+            while len(merged) > self.max_entries:
+                merged.popitem(last=False)
+
+            # write to a per-process temp file then swap, so a crash never leaves a half-written cache
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.version, "entries": list(merged.items())}, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+        finally:
+            if lock_fd is not None:
+                os.close(lock_fd)
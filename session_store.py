@@ -0,0 +1,266 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# payloads smaller than this aren't worth the zlib header and CPU
+COMPRESS_THRESHOLD = 512
+
+
+def to_plain(value):
+    """Turn SDK content blocks into the plain dicts the messages API also accepts"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {k: to_plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_plain(v) for v in value]
+    return value
+
+
+def encode_message(message, compress=True):
+    payload = json.dumps(to_plain(message), separators=(",", ":")).encode("utf-8")
+    if compress and len(payload) >= COMPRESS_THRESHOLD:
+        return zlib.compress(payload), True
+    return payload, False
+
+
+def decode_message(payload, compressed):
+    if compressed:
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+
+class SessionConflict(Exception):
+    """Another request extended the session after this turn loaded it"""
+
+
+class SessionStore:
+    """Conversation history per session id - only new messages are ever written"""
+
+    def load(self, session_id):
+        raise NotImplementedError
+
+    def append(self, session_id, messages, expected_length=None):
+        """Add messages to the end of a session.
+
+        With expected_length set, raise SessionConflict unless the session
+        still holds exactly that many messages, so two overlapping turns
+        can't interleave their messages.
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    def expire(self):
+        """Drop sessions idle for longer than the ttl, returning how many went"""
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Single-process store, for local development and the Flask dev server"""
+
+    def __init__(self, ttl=86400):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        with self._lock:
+            _, messages = self._sessions.get(session_id, (0, []))
+            return list(messages)
+
+    def append(self, session_id, messages, expected_length=None):
+        with self._lock:
+            _, history = self._sessions.get(session_id, (0, []))
+            if expected_length is not None and len(history) != expected_length:
+                raise SessionConflict(session_id)
+            history.extend(to_plain(m) for m in messages)
+            self._sessions[session_id] = (time.time(), history)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def expire(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            stale = [sid for sid, (updated, _) in self._sessions.items() if updated < cutoff]
+            for sid in stale:
+                del self._sessions[sid]
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "messages": sum(len(h) for _, h in self._sessions.values()),
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store shared by every worker on the host, using SQLite in WAL mode.
+
+    WAL lets readers in one process carry on while another appends, so a
+    conversation can hop between gunicorn workers without losing context.
+    """
+
+    def __init__(self, path="sessions.db", ttl=86400, compress=True, expire_interval=300):
+        self.path = path
+        self.ttl = ttl
+        self.compress = compress
+        self.expire_interval = expire_interval
+        self._local = threading.local()
+        self._reaper_pid = None
+        self._reaper_lock = threading.Lock()
+
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at);
+                CREATE TABLE IF NOT EXISTS messages (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    compressed INTEGER NOT NULL,
+                    payload BLOB NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                ) WITHOUT ROWID;
+            """)
+        finally:
+            conn.close()
+
+    def _conn(self):
+        # one connection per thread, and never one inherited across a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        self._ensure_reaper()
+        return conn
+
+    def load(self, session_id):
+        rows = self._conn().execute(
+            "SELECT payload, compressed FROM messages WHERE session_id = ? ORDER BY seq",
+            (session_id,),
+        ).fetchall()
+        return [decode_message(payload, compressed) for payload, compressed in rows]
+
+    def append(self, session_id, messages, expected_length=None):
+        encoded = [encode_message(m, self.compress) for m in messages]
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front, so the length check and the
+        # insert see the same history even with other workers appending
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (last_seq,) = conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) FROM messages WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if expected_length is not None and last_seq + 1 != expected_length:
+                raise SessionConflict(session_id)
+            conn.executemany(
+                "INSERT INTO messages (session_id, seq, compressed, payload) VALUES (?, ?, ?, ?)",
+                [(session_id, last_seq + i + 1, int(compressed), payload)
+                 for i, (payload, compressed) in enumerate(encoded)],
+            )
+            conn.execute(
+                "INSERT INTO sessions (session_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (session_id, time.time()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, session_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def expire(self):
+        cutoff = time.time() - self.ttl
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM messages WHERE session_id IN "
+                "(SELECT session_id FROM sessions WHERE updated_at < ?)",
+                (cutoff,),
+            )
+            removed = conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    def _ensure_reaper(self):
+        # threads don't survive fork, so each worker starts its own on first use
+        if self.expire_interval is None or self._reaper_pid == os.getpid():
+            return
+        with self._reaper_lock:
+            if self._reaper_pid == os.getpid():
+                return
+            self._reaper_pid = os.getpid()
+            threading.Thread(target=self._reap, name="session-reaper", daemon=True).start()
+
+    def _reap(self):
+        while True:
+            time.sleep(self.expire_interval)
+            try:
+                self.expire()
+            except sqlite3.Error as e:
+                print(f"Session expiry failed: {e}")
+
+    def stats(self):
+        conn = self._conn()
+        (sessions,) = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        messages, stored_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM messages"
+        ).fetchone()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": sessions,
+            "messages": messages,
+            "stored_bytes": stored_bytes,
+        }
+
+
+def create_session_store(url, ttl=86400, compress=True, expire_interval=300):
+    """Build a store from a url - 'memory' or 'sqlite:///path/to/sessions.db'
+
+    compress and expire_interval only apply to SQLite; an expire_interval of
+    None or 0 turns the background reaper off.
+    """
+    if url == "memory":
+        return MemorySessionStore(ttl=ttl)
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(
+            url[len("sqlite:///"):],
+            ttl=ttl,
+            compress=compress,
+            expire_interval=expire_interval or None,
+        )
+    raise ValueError(f"Unknown session store: {url}")
@@ -0,0 +1,71 @@
+import gc
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class StartupReport:
+    """Wall time and peak RSS for each startup phase of this process"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.phases = []
+        self.frozen_objects = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({
+                "phase": name,
+                "pid": os.getpid(),
+                "seconds": round(time.perf_counter() - start, 4),
+                "peak_rss_mb": peak_rss_mb(),
+            })
+
+    def freeze(self):
+        """Move everything allocated so far out of the GC's reach before forking.
+
+        Collections in a worker would otherwise touch (and so copy) every page
+        the master's objects live on, undoing copy-on-write sharing.
+        """
+        gc.collect()
+        gc.freeze()
+        self.frozen_objects = gc.get_freeze_count()
+
+    def as_dict(self):
+        return {
+            "master_pid": self.pid,
+            "pid": os.getpid(),
+            "total_seconds": round(sum(p["seconds"] for p in self.phases), 4),
+            "frozen_objects": self.frozen_objects,
+            "phases": list(self.phases),
+        }
+
+    def log(self, logger):
+        data = self.as_dict()
+        logger.info("Startup report (pid %s):", data["pid"])
+        for p in data["phases"]:
+            logger.info("  - %s: %.3fs, peak RSS %.1f MB", p["phase"], p["seconds"], p["peak_rss_mb"] or 0)
+        logger.info("  total: %.3fs", data["total_seconds"])
+
+
+report = StartupReport()